@@ -1,16 +1,18 @@
-from typing import List, Set, Tuple
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
 from dataclasses import dataclass
+import heapq
 import itertools
 import argparse
 import os
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Photo:
     id: int  # Identifiant unique de la photo
     is_horizontal: bool  # Indique si la photo est horizontale
-    tags: Set[str]  # Ensemble de tags associés à la photo
+    tags: FrozenSet[str]  # Ensemble (immuable) de tags associés à la photo
 
 def read_input(filepath: str) -> List[Photo]:
     """Lit les données d'entrée depuis un fichier et crée une liste d'objets Photo."""
@@ -18,27 +20,34 @@ def read_input(filepath: str) -> List[Photo]:
         print(f"Erreur : Le fichier '{filepath}' n'existe pas.")
         return
     else:
-        photos = []
-        with open(filepath, 'r') as f:
-            n = int(f.readline())  # Nombre total de photos
-            for i in range(n):
-                line = f.readline().strip().split()
-                is_horizontal = line[0] == 'H'  # Vérifie si la photo est horizontale
-                n_tags = int(line[1])  # Nombre de tags
-                tags = set(line[2:2 + n_tags])  # Ensemble des tags
-                photos.append(Photo(i, is_horizontal, tags))
+        # Lecture du fichier en une seule fois puis découpage en lignes
+        with open(filepath, 'rb') as f:
+            lines = f.read().split(b'\n')
+        n = int(lines[0])  # Nombre total de photos
+        photos = [None] * n
+        for i in range(n):
+            line = lines[i + 1].split()
+            is_horizontal = line[0] == b'H'  # Vérifie si la photo est horizontale
+            n_tags = int(line[1])  # Nombre de tags
+            tags = frozenset(t.decode() for t in line[2:2 + n_tags])  # Ensemble des tags
+            photos[i] = Photo(i, is_horizontal, tags)
         return photos
 
-def get_transition_score(tags1: Set[str], tags2: Set[str]) -> int:
-    """Calcule le score de transition entre deux ensembles de tags."""
-    common_tags = len(tags1.intersection(tags2))  # Nombre de tags communs
-    tags_only_in_1 = len(tags1.difference(tags2))  # Nombre de tags uniques dans le premier ensemble
-    tags_only_in_2 = len(tags2.difference(tags1))  # Nombre de tags uniques dans le second ensemble
-    return min(common_tags, tags_only_in_1, tags_only_in_2)
-
 class PhotoSlideshowOptimizer:
-    def __init__(self, photos: List[Photo]):
-        """Initialise l'optimiseur avec la liste des photos et pré-calcule les scores de transition."""
+    def __init__(self, photos: List[Photo], max_pairs: Optional[int] = None,
+                 dedup_pairs: bool = False):
+        """Initialise l'optimiseur avec la liste des photos et pré-calcule les scores de transition.
+
+        max_pairs borne le nombre de paires verticales candidates (les paires aux
+        tags combinés les plus nombreux sont conservées) afin de garder le MIP soluble.
+        Seules ces paires sont stockées, mais toutes les paires sont encore énumérées
+        (temps en O(V²) pour V photos verticales).
+        dedup_pairs active une heuristique qui ignore les paires dont l'union de tags
+        a déjà été vue ; elle réduit le modèle mais peut dégrader l'optimum.
+        """
+        if max_pairs is not None and max_pairs < 0:
+            raise ValueError(f"max_pairs doit être positif ou nul (reçu {max_pairs})")
+
         self.photos = photos
         self.n_photos = len(photos)
 
@@ -46,96 +55,171 @@ class PhotoSlideshowOptimizer:
         self.horizontal_photos = [p.id for p in photos if p.is_horizontal]
         self.vertical_photos = [p.id for p in photos if not p.is_horizontal]
 
-        # Pré-calcul des paires de photos verticales et de leurs tags combinés
-        self.vertical_pairs = []
-        self.vertical_pair_tags = {}
-        for i, j in itertools.combinations(self.vertical_photos, 2):
-            self.vertical_pairs.append((i, j))
-            combined_tags = photos[i].tags.union(photos[j].tags)
-            self.vertical_pair_tags[(i, j)] = combined_tags
-
-        # Pré-calcul des scores de transition entre toutes les combinaisons possibles
-        self.transition_scores = {}
-
-        # Scores entre photos horizontales
-        for i in self.horizontal_photos:
-            for j in self.horizontal_photos:
-                if i != j:
-                    score = get_transition_score(photos[i].tags, photos[j].tags)
-                    self.transition_scores[(i, j)] = score
-
-        # Scores entre photos horizontales et paires verticales
-        for i in self.horizontal_photos:
-            for pair in self.vertical_pairs:
-                score = get_transition_score(photos[i].tags, self.vertical_pair_tags[pair])
-                self.transition_scores[(i, pair)] = score
-                self.transition_scores[(pair, i)] = score
-
-        # Scores entre paires verticales
-        for pair1 in self.vertical_pairs:
-            for pair2 in self.vertical_pairs:
-                if pair1 != pair2:
-                    score = get_transition_score(self.vertical_pair_tags[pair1], self.vertical_pair_tags[pair2])
-                    self.transition_scores[(pair1, pair2)] = score
-
-    def optimize(self, time_limit: int = 3600) -> Tuple[List[List[int]], float]:
-        """Optimise la séquence des diapositives pour maximiser le score total."""
+        # Tags de chaque photo encodés en masque de bits
+        tag2idx = {t: k for k, t in enumerate(sorted({t for p in photos for t in p.tags}))}
+        masks = [sum(1 << tag2idx[t] for t in p.tags) for p in photos]
+
+        # Pré-calcul des paires de photos verticales : les tags combinés d'une paire
+        # sont un simple OU entre les masques de bits des deux photos
+        def candidate_pairs():
+            seen_unions = set()
+            for i, j in itertools.combinations(self.vertical_photos, 2):
+                if dedup_pairs:
+                    union = masks[i] | masks[j]
+                    if union in seen_unions:
+                        continue
+                    seen_unions.add(union)
+                yield i, j
+
+        if max_pairs is None:
+            self.vertical_pairs = list(candidate_pairs())
+        else:
+            # Sélection des max_pairs meilleures paires au fil de l'énumération :
+            # seules les paires retenues sont conservées en mémoire
+            best = heapq.nlargest(max_pairs, candidate_pairs(),
+                                  key=lambda pair: (masks[pair[0]] | masks[pair[1]]).bit_count())
+            self.vertical_pairs = sorted(best)
+        pair_masks = [masks[i] | masks[j] for i, j in self.vertical_pairs]
+
+        # Diapositives candidates : photos horizontales seules puis paires verticales
+        self.items = self.horizontal_photos + self.vertical_pairs
+
+        # Matrice d'appartenance diapositive x tag, dépliée depuis les masques de bits
+        n_tags = len(tag2idx)
+        n_bytes = (n_tags + 7) // 8
+        item_masks = [masks[i] for i in self.horizontal_photos] + pair_masks
+        packed = np.frombuffer(
+            b''.join(mask.to_bytes(n_bytes, 'little') for mask in item_masks), dtype=np.uint8
+        ).reshape(len(item_masks), n_bytes)
+        tag_matrix = np.unpackbits(packed, axis=1, count=n_tags, bitorder='little')
+
+        # Pré-calcul des scores de transition entre toutes les diapositives candidates :
+        # min(|a & b|, |a - b|, |b - a|) avec |a - b| = |a| - |a & b|.
+        # Le produit est calculé en float32 pour passer par BLAS (le produit entier
+        # de NumPy n'est pas vectorisé) ; les comptes restent exacts sous 2**24.
+        dense_tags = tag_matrix.astype(np.float32)
+        common = (dense_tags @ dense_tags.T).astype(np.int32)
+        sizes = tag_matrix.sum(axis=1, dtype=np.int32)
+        self.transition_scores = np.minimum.reduce(
+            [common, sizes[:, None] - common, sizes[None, :] - common]
+        ).astype(np.int32)
+        np.fill_diagonal(self.transition_scores, 0)
+
+    def _greedy_sequence(self, pairs_of: Dict[int, List[int]]) -> List[int]:
+        """Construit une séquence gloutonne de diapositives (indices dans self.items).
+
+        Part de la diapositive ayant la meilleure transition possible puis ajoute
+        à chaque étape la diapositive disponible de meilleur score, tant que ce
+        score est strictement positif.
+        """
+        n_horizontal = len(self.horizontal_photos)
+        available = np.ones(len(self.items), dtype=bool)
+        if not available.size:
+            return []
+
+        current = int(np.argmax(self.transition_scores.max(axis=1)))
+        order = []
+        while True:
+            order.append(current)
+            available[current] = False
+            # Une photo verticale utilisée rend indisponibles toutes ses autres paires
+            if current >= n_horizontal:
+                for i in self.items[current]:
+                    available[pairs_of[i]] = False
+            scores = np.where(available, self.transition_scores[current], -1)
+            nxt = int(np.argmax(scores))
+            if scores[nxt] <= 0:
+                return order
+            current = nxt
+
+    def optimize(self, time_limit: int = 3600) -> Tuple[List[List[int]], int]:
+        """Optimise la séquence des diapositives pour maximiser le score total.
+
+        Formulation de séquencement (type TSP) : y[a, b] = 1 si la diapositive b
+        suit directement la diapositive a, les sous-tours étant éliminés par les
+        contraintes de Miller-Tucker-Zemlin.
+        """
         m = gp.Model("photoSlideshow")
 
-        # Variables de décision : x[i, p] = 1 si la photo/pair i est placée à la position p
-        x = {}
-        for p in range(self.n_photos):
-            for i in self.horizontal_photos:
-                x[i, p] = m.addVar(vtype=GRB.BINARY, name=f'x_{i}_{p}')
-            for pair in self.vertical_pairs:
-                x[pair, p] = m.addVar(vtype=GRB.BINARY, name=f'x_{pair[0]}_{pair[1]}_{p}')
-
-        # Contraintes : chaque position contient au plus une photo/pair
-        for p in range(self.n_photos):
-            m.addConstr(
-                gp.quicksum(x[i, p] for i in self.horizontal_photos) +
-                gp.quicksum(x[pair, p] for pair in self.vertical_pairs) <= 1
-            )
-
-        # Contraintes : chaque photo est utilisée au plus une fois
-        for i in range(self.n_photos):
-            if i in self.horizontal_photos:
-                m.addConstr(
-                    gp.quicksum(x[i, p] for p in range(self.n_photos)) <= 1
-                )
-            else:  # Contraintes pour les photos verticales
-                m.addConstr(
-                    gp.quicksum(x[pair, p] for pair in self.vertical_pairs if i in pair
-                                for p in range(self.n_photos)) <= 1
-                )
+        n_items = len(self.items)
+        nodes = range(n_items)
+        # Seules les transitions de score non nul sont modélisées : deux chaînes
+        # de diapositives peuvent toujours être concaténées avec un score nul
+        edges = [(int(a), int(b)) for a, b in np.argwhere(self.transition_scores > 0)]
 
-        # Objectif : maximiser la somme des scores de transition
-        obj = gp.quicksum(
-            self.transition_scores.get((i, j), 0) * x[i, p] * x[j, p + 1]
-            for p in range(self.n_photos - 1)
-            for i in list(self.horizontal_photos) + list(self.vertical_pairs)
-            for j in list(self.horizontal_photos) + list(self.vertical_pairs)
-            if i != j
+        # Variables de décision : z[a] = 1 si la diapositive a est utilisée,
+        # y[a, b] = 1 si la diapositive b suit directement la diapositive a
+        z = m.addVars(nodes, vtype=GRB.BINARY, name='z')
+        y = m.addVars(edges, vtype=GRB.BINARY, name='y')
+        # Rang de chaque diapositive dans la séquence (MTZ)
+        u = m.addVars(nodes, lb=0, ub=max(n_items - 1, 0), name='u')
+
+        # Contraintes : une diapositive utilisée a au plus un successeur et un prédécesseur
+        m.addConstrs((y.sum(a, '*') <= z[a] for a in nodes), name='out')
+        m.addConstrs((y.sum('*', a) <= z[a] for a in nodes), name='in')
+
+        # Contraintes : chaque photo verticale est utilisée au plus une fois
+        # (les photos horizontales correspondent chacune à une seule diapositive)
+        pairs_of = {i: [] for i in self.vertical_photos}
+        for a, pair in enumerate(self.vertical_pairs, start=len(self.horizontal_photos)):
+            for i in pair:
+                pairs_of[i].append(a)
+        m.addConstrs(
+            (gp.quicksum(z[a] for a in pairs_of[i]) <= 1 for i in self.vertical_photos),
+            name='vertical'
         )
+
+        # Contraintes MTZ d'élimination des sous-tours
+        m.addConstrs(
+            (u[a] - u[b] + n_items * y[a, b] <= n_items - 1 for a, b in edges),
+            name='mtz'
+        )
+
+        # Solution initiale gloutonne pour fournir rapidement un incumbent à Gurobi.
+        # Toutes les variables reçoivent une valeur de départ : Gurobi n'a ainsi pas
+        # à compléter une solution partielle par un sous-MIP.
+        order = self._greedy_sequence(pairs_of)
+        for var in itertools.chain(z.values(), y.values(), u.values()):
+            var.Start = 0
+        for rank, a in enumerate(order):
+            z[a].Start = 1
+            u[a].Start = rank
+        for a, b in zip(order, order[1:]):
+            y[a, b].Start = 1
+
+        # Objectif : maximiser la somme des scores de transition
+        obj = gp.quicksum(int(self.transition_scores[a, b]) * y[a, b] for a, b in edges)
         m.setObjective(obj, GRB.MAXIMIZE)
 
         # Définition du temps limite pour l'optimisation
         m.setParam('TimeLimit', time_limit)
+        # Priorité à la recherche de bonnes solutions réalisables
+        m.setParam('MIPFocus', 1)
 
         # Lancer l'optimisation
         m.optimize()
 
-        # Extraction de la solution optimale
-        if m.status == GRB.OPTIMAL or m.status == GRB.TIME_LIMIT:
-            solution = []
-            for p in range(self.n_photos):
-                for i in self.horizontal_photos:
-                    if x[i, p].X > 0.5:
-                        solution.append([i])
-                for pair in self.vertical_pairs:
-                    if x[pair, p].X > 0.5:
-                        solution.append(list(pair))
-            return solution, m.objVal
+        # Extraction de la solution : on suit chaque chaîne de successeurs depuis
+        # une diapositive sans prédécesseur, puis on concatène les chaînes
+        if (m.status == GRB.OPTIMAL or m.status == GRB.TIME_LIMIT) and m.SolCount > 0:
+            # Récupération groupée des valeurs (un seul appel par famille de variables)
+            y_values = m.getAttr('X', y)
+            z_values = m.getAttr('X', z)
+            successor = {a: b for (a, b), v in y_values.items() if v > 0.5}
+            has_predecessor = set(successor.values())
+            sequence = []
+            for a in nodes:
+                if z_values[a] < 0.5 or a in has_predecessor:
+                    continue
+                while a is not None:
+                    sequence.append(a)
+                    a = successor.get(a)
+            solution = [[item] if isinstance(item, int) else list(item)
+                        for item in (self.items[a] for a in sequence)]
+            # Le score est recalculé sur la séquence écrite : les jonctions entre
+            # chaînes peuvent elles aussi rapporter des points
+            score = int(self.transition_scores[sequence[:-1], sequence[1:]].sum())
+            return solution, score
         else:
             return None, 0
 
@@ -143,13 +227,20 @@ def main():
     """Fonction principale pour exécuter l'optimisation."""
     parser = argparse.ArgumentParser(description="Script pour afficher le contenu d'un fichier texte.")
     parser.add_argument("chemin_fichier", type=str, help="Chemin du fichier texte à lire")
+    parser.add_argument("--max-pairs", type=int, default=None,
+                        help="Nombre maximal de paires de photos verticales candidates "
+                             "(l'énumération des paires reste en O(V²))")
+    parser.add_argument("--dedup-pairs", action="store_true",
+                        help="Heuristique : ignorer les paires verticales dont l'union de tags "
+                             "a déjà été vue (peut dégrader le score)")
 
     args = parser.parse_args()
 
     input_file = args.chemin_fichier
     photos = read_input(input_file)
 
-    optimizer = PhotoSlideshowOptimizer(photos)
+    optimizer = PhotoSlideshowOptimizer(photos, max_pairs=args.max_pairs,
+                                         dedup_pairs=args.dedup_pairs)
     solution, score = optimizer.optimize(time_limit=120)
 
     if solution: